@@ -1,78 +1,121 @@
 #!/usr/bin/env python3
 import argparse
+import functools
+import hashlib
 import json
+import os
+import shlex
+import shutil
+import stat
 import subprocess
+import sys
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
 SCENARIO_KEY = "unlisted-dependencies"
 SKILL_NAME = "knip-detect-unlisted-dependencies"
 IMPORT_MARKER = "// knip-scenario-import"
-
-SCENARIOS: Dict[str, Dict[str, object]] = {
-    "unused-files": {
-        "expected_issue": "unused files",
-        "include_type": "files",
-        "target_subdir": "unused-files",
-        "entry_file": None,
-        "simulation": "どこからも参照されない孤立ファイルを作り、Knipが未使用ファイルを検出できる挙動を試す。",
-    },
-    "unused-dependencies": {
-        "expected_issue": "unused devdependencies",
-        "include_type": "dependencies",
-        "target_subdir": "unused-dependencies",
-        "entry_file": None,
-        "simulation": "package.jsonに未使用のdevDependencyを追加し、Knipが未使用依存を検出できる挙動を試す。",
-    },
-    "unused-exports": {
-        "expected_issue": "unused exports",
-        "include_type": "exports",
-        "target_subdir": "unused-exports",
-        "entry_file": "lib.js",
-        "simulation": "未参照のexport関数を作り、Knipが未使用エクスポートを検出できる挙動を試す。",
-    },
-    "unlisted-dependencies": {
-        "expected_issue": "unlisted dependencies",
-        "include_type": "unlisted",
-        "target_subdir": "unlisted-dependencies",
-        "entry_file": "use-dayjs.js",
-        "simulation": "未宣言パッケージをimportして、Knipが未登録依存を検出できる挙動を試す。",
-    },
-    "unlisted-binaries": {
-        "expected_issue": "unlisted binaries",
-        "include_type": "binaries",
-        "target_subdir": "unlisted-binaries",
-        "entry_file": None,
-        "simulation": "未宣言CLIをscriptsで呼び出し、Knipが未登録バイナリを検出できる挙動を試す。",
-    },
-    "unresolved-imports": {
-        "expected_issue": "unresolved imports",
-        "include_type": "unresolved",
-        "target_subdir": "unresolved-imports",
-        "entry_file": "broken-import.js",
-        "simulation": "存在しないモジュールをimportして、Knipが未解決importを検出できる挙動を試す。",
-    },
-    "duplicate-exports": {
-        "expected_issue": "duplicate exports",
-        "include_type": "duplicates",
-        "target_subdir": "duplicate-exports",
-        "entry_file": "index.js",
-        "simulation": "重複したexport定義を作り、Knipが重複エクスポートを検出できる挙動を試す。",
-    },
-    "unused-exported-types": {
-        "expected_issue": "unused exported types",
-        "include_type": "types",
-        "target_subdir": "unused-exported-types",
-        "entry_file": "types.ts",
-        "simulation": "未参照のexport typeを作り、Knipが未使用エクスポート型を検出できる挙動を試す。",
-    },
+LOCKFILE_SYNC_STAMP = ".codex/.lockfile-sync-hash"
+PACKAGE_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, indent=2)
+
+
+class Scenario(NamedTuple):
+    expected_issue: str
+    include_type: str
+    target_subdir: str
+    entry_file: Optional[str]
+    simulation: str
+    files: Tuple[Tuple[str, bytes], ...] = ()
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "unused-files": Scenario(
+        expected_issue="unused files",
+        include_type="files",
+        target_subdir="unused-files",
+        entry_file=None,
+        simulation="どこからも参照されない孤立ファイルを作り、Knipが未使用ファイルを検出できる挙動を試す。",
+        files=(("orphan.js", b"export const orphanValue = 'knip-unused-file';\n"),),
+    ),
+    "unused-dependencies": Scenario(
+        expected_issue="unused devdependencies",
+        include_type="dependencies",
+        target_subdir="unused-dependencies",
+        entry_file=None,
+        simulation="package.jsonに未使用のdevDependencyを追加し、Knipが未使用依存を検出できる挙動を試す。",
+    ),
+    "unused-exports": Scenario(
+        expected_issue="unused exports",
+        include_type="exports",
+        target_subdir="unused-exports",
+        entry_file="lib.js",
+        simulation="未参照のexport関数を作り、Knipが未使用エクスポートを検出できる挙動を試す。",
+        files=(("lib.js", b"export function unusedFn() {\n  return 'knip-unused-export';\n}\n"),),
+    ),
+    "unlisted-dependencies": Scenario(
+        expected_issue="unlisted dependencies",
+        include_type="unlisted",
+        target_subdir="unlisted-dependencies",
+        entry_file="use-dayjs.js",
+        simulation="未宣言パッケージをimportして、Knipが未登録依存を検出できる挙動を試す。",
+        files=(("use-dayjs.js", b"import dayjs from 'dayjs';\n\nexport const formatNow = () => dayjs().format();\n"),),
+    ),
+    "unlisted-binaries": Scenario(
+        expected_issue="unlisted binaries",
+        include_type="binaries",
+        target_subdir="unlisted-binaries",
+        entry_file=None,
+        simulation="未宣言CLIをscriptsで呼び出し、Knipが未登録バイナリを検出できる挙動を試す。",
+    ),
+    "unresolved-imports": Scenario(
+        expected_issue="unresolved imports",
+        include_type="unresolved",
+        target_subdir="unresolved-imports",
+        entry_file="broken-import.js",
+        simulation="存在しないモジュールをimportして、Knipが未解決importを検出できる挙動を試す。",
+        files=(
+            (
+                "broken-import.js",
+                b"import { missingValue } from './not-found.js';\n\nexport const unresolvedValue = missingValue;\n",
+            ),
+        ),
+    ),
+    "duplicate-exports": Scenario(
+        expected_issue="duplicate exports",
+        include_type="duplicates",
+        target_subdir="duplicate-exports",
+        entry_file="index.js",
+        simulation="重複したexport定義を作り、Knipが重複エクスポートを検出できる挙動を試す。",
+        files=(
+            ("a.js", b"export const duplicated = 'from-a';\n"),
+            ("b.js", b"export const duplicated = 'from-b';\n"),
+            ("index.js", b"const duplicated = 'value';\nexport { duplicated };\nexport { duplicated };\n"),
+        ),
+    ),
+    "unused-exported-types": Scenario(
+        expected_issue="unused exported types",
+        include_type="types",
+        target_subdir="unused-exported-types",
+        entry_file="types.ts",
+        simulation="未参照のexport typeを作り、Knipが未使用エクスポート型を検出できる挙動を試す。",
+        files=(("types.ts", b"export type UnusedType = {\n  id: string;\n  value: number;\n};\n"),),
+    ),
 }
 
 
+def emit(rows: List[str]) -> None:
+    sys.stdout.write("".join(row + "\n" for row in rows))
+    sys.stdout.flush()
+
+
+_REPO_ROOT = Path(__file__).resolve().parents[4]
+
+
 def repo_root() -> Path:
-    return Path(__file__).resolve().parents[4]
+    return _REPO_ROOT
 
 
+@functools.lru_cache(maxsize=None)
 def resolve_target_root(arg: Optional[str], subdir: str) -> Path:
     root = repo_root()
     if arg:
@@ -91,39 +134,167 @@ def display_path(path: Path) -> str:
         return str(path)
 
 
-def write_file(path: Path, content: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(content, encoding="utf-8")
+ChangedFiles = Dict[Path, str]
+
+
+def record_change(changed: ChangedFiles, path: Path) -> None:
+    if path not in changed:
+        changed[path] = display_path(path)
+
+
+_READ_CACHE: Dict[Path, Tuple[int, int, str]] = {}
+
+
+def read_bytes(path: Path) -> bytes:
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        chunks = [os.read(fd, os.fstat(fd).st_size + 1)]
+        while chunks[-1]:
+            chunks.append(os.read(fd, 1 << 16))
+        return b"".join(chunks)
+    finally:
+        os.close(fd)
+
+
+def write_bytes(path: Path, data: bytes) -> None:
+    _READ_CACHE.pop(path, None)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def write_files(parent: Path, items: Tuple[Tuple[str, bytes], ...]) -> List[Path]:
+    parent.mkdir(parents=True, exist_ok=True)
+    written: List[Path] = []
+    for name, content in items:
+        path = parent / name
+        write_bytes(path, content)
+        written.append(path)
+    return written
+
+
+def read_file(path: Path) -> str:
+    st = path.stat()
+    cached = _READ_CACHE.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    text = read_bytes(path).decode("utf-8")
+    _READ_CACHE[path] = (st.st_mtime_ns, st.st_size, text)
+    return text
+
+
+def replace_file(path: Path, content: str) -> None:
+    target = path.resolve()
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        write_bytes(tmp, content.encode("utf-8"))
+        try:
+            os.chmod(tmp, stat.S_IMODE(target.stat().st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, target)
+        _READ_CACHE.pop(path, None)
+        _READ_CACHE.pop(target, None)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def save_json(path: Path, data: dict) -> bool:
+    content = PACKAGE_JSON_ENCODER.encode(data) + "\n"
+    try:
+        if read_file(path) == content:
+            return False
+    except FileNotFoundError:
+        pass
+    replace_file(path, content)
+    return True
+
+
+def file_hash(path: Path) -> Optional[str]:
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb", buffering=0) as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def dependency_hash(data: dict) -> str:
+    deps = [sorted(data.get(field, {}).items()) for field in ("dependencies", "devDependencies")]
+    return hashlib.blake2b(json.dumps(deps).encode("utf-8")).hexdigest()
+
+
+def lockfile_in_sync(data: dict, lockfile: Path) -> bool:
+    try:
+        packages = json.loads(read_file(lockfile)).get("packages", {})
+    except (FileNotFoundError, ValueError):
+        return False
 
+    manifest = packages.get("", {})
+    for field in ("dependencies", "devDependencies"):
+        deps = data.get(field, {})
+        if manifest.get(field, {}) != deps:
+            return False
+        if any(f"node_modules/{name}" not in packages for name in deps):
+            return False
+    return True
 
-def load_json(path: Path) -> dict:
-    return json.loads(path.read_text(encoding="utf-8"))
 
+@functools.lru_cache(maxsize=1)
+def npm_executable() -> str:
+    return shutil.which("npm") or "npm"
 
-def save_json(path: Path, data: dict) -> None:
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
 
+def sync_lockfile(data: dict, changed: ChangedFiles) -> None:
+    root = repo_root()
+    lockfile = root / "package-lock.json"
+    before = file_hash(lockfile)
+    deps_hash = dependency_hash(data)
 
-def sync_lockfile(changed: List[Path]) -> None:
-    lockfile = repo_root() / "package-lock.json"
-    before = lockfile.read_text(encoding="utf-8") if lockfile.exists() else None
+    stamp = root / LOCKFILE_SYNC_STAMP
+    if stamp.exists() and read_file(stamp) == f"{deps_hash} {before}\n":
+        return
+    if lockfile_in_sync(data, lockfile):
+        return
 
-    proc = subprocess.run(
-        ["npm", "install", "--package-lock-only", "--ignore-scripts"],
-        cwd=repo_root(),
-        capture_output=True,
-        text=True,
+    proc = subprocess.Popen(
+        [npm_executable(), "install", "--package-lock-only", "--ignore-scripts"],
+        cwd=root,
+        env=dict(os.environ, npm_config_audit="false", npm_config_fund="false", npm_config_progress="false"),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
     )
+    _, stderr = proc.communicate()
     if proc.returncode != 0:
-        print("[warn] Failed to sync package-lock.json. Run manually if needed:")
-        print("       npm install --package-lock-only --ignore-scripts")
-        if proc.stderr:
-            print(proc.stderr.strip())
+        rows = [
+            "[warn] Failed to sync package-lock.json. Run manually if needed:",
+            "       npm install --package-lock-only --ignore-scripts",
+        ]
+        if stderr:
+            rows.append(stderr.decode("utf-8", errors="replace").strip())
+        emit(rows)
         return
 
-    after = lockfile.read_text(encoding="utf-8") if lockfile.exists() else None
+    after = file_hash(lockfile)
+    replace_file(stamp, f"{deps_hash} {after}\n")
     if before != after:
-        changed.append(lockfile)
+        record_change(changed, lockfile)
+
+
+@functools.lru_cache(maxsize=None)
+def import_line_for(subdir: str, entry_file: str) -> bytes:
+    return f"import './knip-lab/{subdir}/{entry_file}'; {IMPORT_MARKER}\n".encode("utf-8")
 
 
 def update_main_import(entry_file: Optional[str], subdir: str, add: bool) -> bool:
@@ -131,88 +302,81 @@ def update_main_import(entry_file: Optional[str], subdir: str, add: bool) -> boo
         return False
 
     main_path = repo_root() / "src" / "main.jsx"
-    import_line = "import './knip-lab/{}/{}'; {}\n".format(subdir, entry_file, IMPORT_MARKER)
-    current = main_path.read_text(encoding="utf-8")
+    import_line = import_line_for(subdir, entry_file)
+    current = read_bytes(main_path)
+    idx = current.find(import_line)
 
     if add:
-        if import_line not in current:
-            main_path.write_text(import_line + current, encoding="utf-8")
-            return True
-        return False
-
-    if import_line in current:
-        main_path.write_text(current.replace(import_line, ""), encoding="utf-8")
+        if idx != -1:
+            return False
+        write_bytes(main_path, import_line + current)
         return True
-    return False
 
+    if idx == -1:
+        return False
+    write_bytes(main_path, current[:idx] + current[idx + len(import_line):])
+    return True
 
-def apply_scenario_create(key: str, target_root: Path, changed: List[Path]) -> None:
-    root = repo_root()
-    subdir = str(SCENARIOS[key]["target_subdir"])
 
-    if key == "unused-files":
-        p = target_root / "orphan.js"
-        write_file(p, "export const orphanValue = 'knip-unused-file';\n")
-        changed.append(p)
+def create_unused_dependency(changed: ChangedFiles) -> None:
+    pkg = repo_root() / "package.json"
+    raw = read_file(pkg)
+    if '"left-pad"' in raw:
         return
-
-    if key == "unused-exports":
-        p = target_root / "lib.js"
-        write_file(p, "export function unusedFn() {\n  return 'knip-unused-export';\n}\n")
-        changed.append(p)
-
-    elif key == "unlisted-dependencies":
-        p = target_root / "use-dayjs.js"
-        write_file(p, "import dayjs from 'dayjs';\n\nexport const formatNow = () => dayjs().format();\n")
-        changed.append(p)
-
-    elif key == "unresolved-imports":
-        p = target_root / "broken-import.js"
-        write_file(p, "import { missingValue } from './not-found.js';\n\nexport const unresolvedValue = missingValue;\n")
-        changed.append(p)
-
-    elif key == "duplicate-exports":
-        a = target_root / "a.js"
-        b = target_root / "b.js"
-        i = target_root / "index.js"
-        write_file(a, "export const duplicated = 'from-a';\n")
-        write_file(b, "export const duplicated = 'from-b';\n")
-        write_file(i, "const duplicated = 'value';\nexport { duplicated };\nexport { duplicated };\n")
-        changed.extend([a, b, i])
-
-    elif key == "unused-exported-types":
-        p = target_root / "types.ts"
-        write_file(p, "export type UnusedType = {\n  id: string;\n  value: number;\n};\n")
-        changed.append(p)
-
-    elif key == "unused-dependencies":
-        pkg = root / "package.json"
-        data = load_json(pkg)
-        dev = data.setdefault("devDependencies", {})
-        if "left-pad" not in dev:
-            dev["left-pad"] = "^1.3.0"
-            save_json(pkg, data)
-            changed.append(pkg)
-            sync_lockfile(changed)
+    data = json.loads(raw)
+    data.setdefault("devDependencies", {})["left-pad"] = "^1.3.0"
+    if save_json(pkg, data):
+        record_change(changed, pkg)
+        sync_lockfile(data, changed)
+
+
+def create_unlisted_binary(changed: ChangedFiles) -> None:
+    pkg = repo_root() / "package.json"
+    marker = "knip:scenario:unlisted-binary"
+    raw = read_file(pkg)
+    if f'"{marker}"' in raw:
         return
+    data = json.loads(raw)
+    data.setdefault("scripts", {})[marker] = "tsx --version"
+    if save_json(pkg, data):
+        record_change(changed, pkg)
+
+
+SCENARIO_CREATORS: Dict[str, Callable[[ChangedFiles], None]] = {
+    "unused-dependencies": create_unused_dependency,
+    "unlisted-binaries": create_unlisted_binary,
+}
 
-    elif key == "unlisted-binaries":
-        pkg = root / "package.json"
-        data = load_json(pkg)
-        scripts = data.setdefault("scripts", {})
-        marker = "knip:scenario:unlisted-binary"
-        if marker not in scripts:
-            scripts[marker] = "tsx --version"
-            save_json(pkg, data)
-            changed.append(pkg)
-        return
 
-    if update_main_import(SCENARIOS[key]["entry_file"], subdir, add=True):
-        changed.append(root / "src" / "main.jsx")
+def apply_scenario_create(key: str, target_root: Path, changed: ChangedFiles) -> None:
+    scenario = SCENARIOS[key]
 
+    if scenario.files:
+        for path in write_files(target_root, scenario.files):
+            record_change(changed, path)
 
-def line_preview(path: Path, center_line: Optional[int] = None, radius: int = 3, max_lines: int = 40) -> List[str]:
-    content = path.read_text(encoding="utf-8").splitlines()
+    creator = SCENARIO_CREATORS.get(key)
+    if creator is not None:
+        creator(changed)
+
+    if update_main_import(scenario.entry_file, scenario.target_subdir, add=True):
+        record_change(changed, repo_root() / "src" / "main.jsx")
+
+
+_LINES_CACHE: Dict[Path, Tuple[str, List[str]]] = {}
+
+
+def load_lines(path: Path) -> List[str]:
+    text = read_file(path)
+    cached = _LINES_CACHE.get(path)
+    if cached is not None and cached[0] is text:
+        return cached[1]
+    lines = text.splitlines()
+    _LINES_CACHE[path] = (text, lines)
+    return lines
+
+
+def line_preview(content: List[str], center_line: Optional[int] = None, radius: int = 3, max_lines: int = 40) -> List[str]:
     total = len(content)
 
     if total == 0:
@@ -225,129 +389,126 @@ def line_preview(path: Path, center_line: Optional[int] = None, radius: int = 3,
         start = 1
         end = min(total, max_lines)
 
-    rows = []
-    for idx in range(start, end + 1):
-        rows.append("{:>4} | {}".format(idx, content[idx - 1]))
+    rows = [f"{idx:>4} | {line}" for idx, line in enumerate(content[start - 1:end], start=start)]
     if end < total:
-        rows.append("  ... | ({} more lines)".format(total - end))
+        rows.append(f"  ... | ({total - end} more lines)")
     return rows
 
 
-def find_line_number(path: Path, needle: str) -> Optional[int]:
-    for i, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
-        if needle in line:
-            return i
+def find_line_number(content: List[str], needle: str) -> Optional[int]:
+    return next((i for i, line in enumerate(content, start=1) if needle in line), None)
+
+
+def preview_needle(path: Path, scenario_key: str) -> Optional[str]:
+    if path.name == "main.jsx":
+        return IMPORT_MARKER
+    if path.name == "package.json":
+        if scenario_key == "unused-dependencies":
+            return '"left-pad"'
+        if scenario_key == "unlisted-binaries":
+            return '"knip:scenario:unlisted-binary"'
     return None
 
 
-def print_change_preview(changed: List[Path], scenario_key: str) -> None:
-    print("changePreview:")
+def print_change_preview(changed: ChangedFiles, scenario_key: str) -> None:
+    rows = ["changePreview:"]
 
-    has_preview = False
-    for path in changed:
-        if not path.exists() or not path.is_file():
+    for path, shown in changed.items():
+        try:
+            content = load_lines(path)
+        except (FileNotFoundError, IsADirectoryError):
             continue
 
-        center = None
-
-        if path.name == "main.jsx":
-            center = find_line_number(path, IMPORT_MARKER)
-        elif path.name == "package.json":
-            if scenario_key == "unused-dependencies":
-                center = find_line_number(path, '"left-pad"')
-            elif scenario_key == "unlisted-binaries":
-                center = find_line_number(path, '"knip:scenario:unlisted-binary"')
+        needle = preview_needle(path, scenario_key)
+        center = find_line_number(content, needle) if needle else None
 
-        print("- file: {}".format(display_path(path)))
-        for row in line_preview(path, center_line=center):
-            print("  {}".format(row))
-        has_preview = True
+        rows.append(f"- file: {shown}")
+        rows.extend(f"  {row}" for row in line_preview(content, center_line=center))
 
-    if not has_preview:
-        print("- (no file preview)")
+    if len(rows) == 1:
+        rows.append("- (no file preview)")
+    emit(rows)
 
 
-def build_verify_command(scenario: Dict[str, object]) -> str:
+def build_verify_command(scenario: Scenario) -> str:
     _ = scenario
     return "npm run knip"
 
 
-def build_cleanup_commands(changed: List[Path], target_root: Path) -> List[str]:
-    root = repo_root()
-    restore_files: List[str] = []
-
-    for path in changed:
-        if not path.is_absolute():
-            continue
-        if not str(path).startswith(str(root)):
-            continue
-        rel = path.relative_to(root)
-        if rel == Path("package.json") or rel == Path("package-lock.json") or rel == Path("src/main.jsx"):
-            restore_files.append(str(rel))
-
-    dedup_restore = list(dict.fromkeys(restore_files))
+def build_cleanup_commands(changed: ChangedFiles, target_root: Path) -> List[str]:
+    restore_targets = ("package.json", "package-lock.json", os.path.join("src", "main.jsx"))
+    dedup_restore = list(dict.fromkeys(shown for shown in changed.values() if shown in restore_targets))
 
     commands: List[str] = []
     if dedup_restore:
-        commands.append("git restore -- {}".format(" ".join(dedup_restore)))
+        commands.append(f"git restore -- {shlex.join(dedup_restore)}")
 
-    commands.append("rm -rf {}".format(target_root))
+    commands.append(f"rm -rf {shlex.quote(os.fspath(target_root))}")
     return commands
 
 
-def print_intro(mode: str, scenario: Dict[str, object], target_root: Path) -> None:
-    print("simulationIntro:")
-    print("- skill: {}".format(SKILL_NAME))
-    print("- mode: {}".format(mode))
-    print("- whatToSimulate: {}".format(scenario["simulation"]))
-    print("- expectedIssue: {}".format(scenario["expected_issue"]))
-    print("- targetRoot: {}".format(target_root))
-    print("- verifyWith: {}".format(build_verify_command(scenario)))
-
-
-def print_outro(mode: str, scenario: Dict[str, object], changed: List[Path], status: str = "ok") -> None:
-    print("runSummary:")
-    print("- mode: {}".format(mode))
-    print("- simulatedIssue: {}".format(scenario["expected_issue"]))
-    print("- status: {}".format(status))
-    print("- changedCount: {}".format(len(changed)))
-    print("- changedFiles:")
-    if changed:
-        for p in changed:
-            print("  - {}".format(display_path(p)))
-    else:
-        print("  - (none)")
+def print_intro(mode: str, scenario: Scenario, target_root: Path) -> None:
+    emit(
+        [
+            "simulationIntro:",
+            f"- skill: {SKILL_NAME}",
+            f"- mode: {mode}",
+            f"- whatToSimulate: {scenario.simulation}",
+            f"- expectedIssue: {scenario.expected_issue}",
+            f"- targetRoot: {target_root}",
+            f"- verifyWith: {build_verify_command(scenario)}",
+        ]
+    )
+
+
+def print_changed_files(changed: ChangedFiles) -> None:
+    rows = ["changedFiles:"]
+    rows.extend(f"- {p}" for p in changed)
+    if not changed:
+        rows.append("- (none)")
+    emit(rows)
+
 
+def print_outro(mode: str, scenario: Scenario, changed: ChangedFiles, status: str = "ok") -> None:
+    rows = [
+        "runSummary:",
+        f"- mode: {mode}",
+        f"- simulatedIssue: {scenario.expected_issue}",
+        f"- status: {status}",
+        f"- changedCount: {len(changed)}",
+        "- changedFiles:",
+    ]
+    rows.extend(f"  - {shown}" for shown in changed.values())
+    if not changed:
+        rows.append("  - (none)")
+    emit(rows)
 
-def print_next_steps(scenario: Dict[str, object], changed: List[Path], target_root: Path) -> None:
-    print("nextSteps:")
-    print("- verifyCommand: {}".format(build_verify_command(scenario)))
-    print("- cleanupCommands:")
-    for command in build_cleanup_commands(changed, target_root):
-        print("  - {}".format(command))
+
+def print_next_steps(scenario: Scenario, changed: ChangedFiles, target_root: Path) -> None:
+    rows = [
+        "nextSteps:",
+        f"- verifyCommand: {build_verify_command(scenario)}",
+        "- cleanupCommands:",
+    ]
+    rows.extend(f"  - {command}" for command in build_cleanup_commands(changed, target_root))
+    emit(rows)
 
 
 def main() -> int:
-    parser = argparse.ArgumentParser(description="{} scenario controller".format(SKILL_NAME))
+    parser = argparse.ArgumentParser(description=f"{SKILL_NAME} scenario controller")
     parser.add_argument("--mode", choices=["create"], required=True)
     parser.add_argument("--targetRoot", default=None)
     args = parser.parse_args()
 
     scenario = SCENARIOS[SCENARIO_KEY]
-    target_root = resolve_target_root(args.targetRoot, str(scenario["target_subdir"]))
+    target_root = resolve_target_root(args.targetRoot, scenario.target_subdir)
 
     print_intro(args.mode, scenario, target_root)
 
-    changed: List[Path] = []
+    changed: ChangedFiles = {}
     apply_scenario_create(SCENARIO_KEY, target_root, changed)
 
-    print("changedFiles:")
-    if changed:
-        for p in changed:
-            print("- {}".format(p))
-    else:
-        print("- (none)")
-
+    print_changed_files(changed)
     print_change_preview(changed, SCENARIO_KEY)
     print_outro(args.mode, scenario, changed, status="ok")
     print_next_steps(scenario, changed, target_root)